@@ -1,5 +1,6 @@
 import os
-import json
+
+import orjson
 from google import genai
 
 MODEL = "gemini-2.5-flash"
@@ -42,13 +43,60 @@ def read_requirement() -> str:
     return "\n".join(lines).strip()
 
 
+def balanced_block(text: str, start: int):
+    # The {...} block opening at text[start], or None if it is never closed.
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def find_json(text: str):
+    # Returns the first balanced {...} block that parses as JSON, parsed, or None.
+    # Tries each "{" in turn, so prose braces before the report ("{name}", an
+    # unclosed "{") are skipped; braces inside JSON strings don't count.
+    start = text.find("{")
+    while start != -1:
+        block = balanced_block(text, start)
+        if block is not None:
+            try:
+                return orjson.loads(block)
+            except orjson.JSONDecodeError:
+                pass
+        start = text.find("{", start + 1)
+    return None
+
+
 def extract_json(text: str) -> dict:
+    # Common case: the model returned pure JSON, skip the search.
+    # Falls through when it only looks like it, e.g. two objects back to back.
+    if text.startswith("{") and text.endswith("}"):
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
     # If model adds extra text, extract the first JSON block
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1:
+    report = find_json(text)
+    if report is None:
         raise ValueError("No JSON found in output:\n" + text)
-    return json.loads(text[start:end + 1])
+    return report
 
 
 def main():
@@ -81,9 +129,7 @@ def main():
         if not items:
             print("- (none)\n")
             return
-        for item in items:
-            print(f"- {item}")
-        print()
+        print("\n".join(f"- {item}" for item in items) + "\n")
 
     show_list("Ambiguities:", report.get("ambiguities", []))
     show_list("Missing information:", report.get("missing_information", []))
@@ -95,7 +141,7 @@ def main():
 
     # Save output to a file
     with open("last_report.json", "w", encoding="utf-8") as f:
-        json.dump(report, f, indent=2)
+        f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2).decode())
 
     print("✅ Saved JSON output to last_report.json")
 
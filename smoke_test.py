@@ -3,25 +3,30 @@
 This test validates that `last_report.json` exists and contains the
 required top-level keys and types expected by consumers.
 """
-import json
 import sys
 from pathlib import Path
+from typing import Annotated, List
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 
 ROOT = Path(__file__).parent
 REPORT = ROOT / "last_report.json"
 
-REQUIRED_KEYS = {
-    "summary": str,
-    "clarity_score": int,
-    "clarity_score_reason": str,
-    "ambiguities": list,
-    "missing_information": list,
-    "assumptions": list,
-    "risks_and_dependencies": list,
-    "edge_cases": list,
-    "acceptance_criteria": list,
-    "test_scenarios": list,
-}
+
+class Report(BaseModel):
+    # strict: no coercion, e.g. "80" is not accepted as clarity_score
+    model_config = ConfigDict(strict=True)
+
+    summary: str
+    clarity_score: Annotated[int, Field(ge=0, le=100)]
+    clarity_score_reason: str
+    ambiguities: List[str]
+    missing_information: List[str]
+    assumptions: List[str]
+    risks_and_dependencies: List[str]
+    edge_cases: List[str]
+    acceptance_criteria: List[str]
+    test_scenarios: List[str]
 
 
 def main():
@@ -29,20 +34,11 @@ def main():
         print(f"FAIL: {REPORT} not found")
         sys.exit(2)
 
-    data = json.loads(REPORT.read_text(encoding="utf-8"))
-
-    for k, t in REQUIRED_KEYS.items():
-        if k not in data:
-            print(f"FAIL: missing key: {k}")
-            sys.exit(2)
-        if not isinstance(data[k], t):
-            print(f"FAIL: key {k} expected {t.__name__}, got {type(data[k]).__name__}")
-            sys.exit(2)
-
-    # additional check: clarity_score range
-    cs = data.get("clarity_score")
-    if not (0 <= cs <= 100):
-        print(f"FAIL: clarity_score out of range: {cs}")
+    # One validation pass covers required keys, types and the clarity_score range
+    try:
+        Report.model_validate_json(REPORT.read_bytes())
+    except ValidationError as e:
+        print(f"FAIL: {e}")
         sys.exit(2)
 
     print("OK: last_report.json looks valid")
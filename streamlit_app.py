@@ -1,70 +1,340 @@
 # streamlit_app.py
-import json
+import asyncio
+import contextlib
+import csv
+import hashlib
+import io
+import itertools
 import os
 import re
-from typing import Any, Dict, List, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
 
+import diskcache
+import orjson
 import streamlit as st
 from dotenv import load_dotenv
 from google import genai
+from google.genai import errors, types
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 # ----------------------------
 # Config
 # ----------------------------
-load_dotenv()
-
-MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")  # you can change later
-API_KEY = os.getenv("GEMINI_API_KEY")
+@st.cache_resource
+def load_env() -> Dict[str, Optional[str]]:
+    """Reads .env once per process instead of on every rerun (restart the app after editing it)."""
+    load_dotenv()
+    return {"model": os.getenv("GEMINI_MODEL", "gemini-1.5-flash"), "api_key": os.getenv("GEMINI_API_KEY")}
+
+
+MODEL = load_env()["model"]  # you can change later
+API_KEY = load_env()["api_key"]
+LLM_CACHE_TTL_SECONDS = 3600
+LLM_DISK_CACHE_DIR = ".llm_cache"
+LLM_DISK_CACHE_TTL_SECONDS = 86400
+MAX_CONCURRENT_LLM_CALLS = 8  # per process, shared by threaded, streaming and async calls
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_OUTPUT_TOKENS = 8192  # output limit of the default model; a truncated response is not valid JSON
+REQUIREMENTS_PER_CALL = 4  # ~1-2k output tokens per report, so the array stays under MAX_OUTPUT_TOKENS
+MIN_REQUIREMENT_TOKENS = 5  # below this ("login page") there is nothing to analyze
+MAX_REQUIREMENT_TOKENS = 30000  # above this the Analyzer switches to section-by-section
+# Requirements whose length is clearly between the token thresholds skip the count_tokens round trip
+GATE_MIN_CHARS = 40
+GATE_MAX_CHARS = 100_000
 
 
 # ----------------------------
 # Helpers
 # ----------------------------
+@st.cache_resource
 def get_client() -> genai.Client:
+    """One client per process, so every rerun and click reuses the same HTTP connection pool."""
     if not API_KEY:
         raise RuntimeError("GEMINI_API_KEY not found. Add it to .env file.")
     return genai.Client(api_key=API_KEY)
 
 
-def extract_json(text: str) -> Dict[str, Any]:
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Shared pool for running Gemini calls concurrently (they are I/O-bound, so threads are enough)."""
+    return ThreadPoolExecutor(max_workers=4)
+
+
+@st.cache_resource
+def get_disk_cache() -> diskcache.Cache:
+    """Persistent LLM results, shared across restarts, Streamlit workers and users."""
+    return diskcache.Cache(LLM_DISK_CACHE_DIR)
+
+
+@st.cache_resource
+def get_inflight() -> Tuple[Dict[str, Future], threading.Lock]:
+    """Futures of LLM calls currently running, by cache key, so concurrent identical calls share one request."""
+    return {}, threading.Lock()
+
+
+@st.cache_resource
+def get_llm_semaphore() -> threading.Semaphore:
+    """Caps in-flight model calls so bursts queue up locally instead of tripping the rate limit."""
+    return threading.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+
+@contextlib.asynccontextmanager
+async def llm_slot(gate: asyncio.Semaphore) -> AsyncIterator[None]:
     """
-    Tries to parse JSON from model output robustly:
-    - If output is pure JSON, parse directly
-    - Else find the first {...} JSON block and parse it
+    Async side of the process-wide cap: takes a slot of the same semaphore as the threaded calls.
+    Polls instead of blocking so the event loop keeps running, and a cancelled wait can't leak a slot.
+    `gate` is the run's own asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS): the rest of a large fan-out
+    waits on it without waking up, so at most that many coroutines poll.
     """
-    text = text.strip()
+    async with gate:
+        semaphore = get_llm_semaphore()
+        while not semaphore.acquire(blocking=False):
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            semaphore.release()
 
-    # 1) direct parse
-    try:
-        return json.loads(text)
-    except Exception:
-        pass
 
-    # 2) find a JSON object block
-    match = re.search(r"\{.*\}", text, flags=re.DOTALL)
-    if not match:
-        raise ValueError("Model did not return JSON. Raw output:\n" + text)
+def is_transient(e: BaseException) -> bool:
+    return isinstance(e, errors.APIError) and e.code in RETRYABLE_STATUS_CODES
+
+
+# Rate limits (429) and server hiccups (5xx) are retried with jittered exponential backoff;
+# anything else, or the last failure, reaches the caller unchanged.
+llm_retry = retry(
+    retry=retry_if_exception(is_transient),
+    wait=wait_exponential_jitter(initial=0.5, max=8),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
+
 
-    json_str = match.group(0)
+# Bound once per rerun; the UI refuses to call the model when the key is missing.
+_CLIENT = get_client() if API_KEY else None
+_MODELS = _CLIENT.models if _CLIENT else None
+
+
+def response_schema(example: Any) -> Dict[str, Any]:
+    """
+    Turns an example-shaped schema (like ANALYZE_SCHEMA) into a Gemini response schema,
+    so the example dict stays the single source of truth for the report shape.
+    """
+    if isinstance(example, dict):
+        keys = list(example)
+        return {
+            "type": "OBJECT",
+            "properties": {k: response_schema(v) for k, v in example.items()},
+            "required": keys,
+            "property_ordering": keys,
+        }
+    if isinstance(example, list):
+        return {"type": "ARRAY", "items": response_schema(example[0])}
+    if isinstance(example, int):
+        return {"type": "INTEGER"}
+    return {"type": "STRING"}
+
+
+def gen_config(task: str, tier: str) -> types.GenerateContentConfig:
+    """
+    Generation config for a task and service tier ("priority" for the single interactive Analyze,
+    "flex" for background calls, "standard" for bulk fan-out):
+    - the task preamble as system instruction
+    - constrained JSON decoding, so the output always matches the task's response schema
+    "standard" is the API default, so no tier is sent for it.
+    SDKs that don't know `service_tier` yet reject it; fall back to the default (standard) tier then.
+    """
+    fields: Dict[str, Any] = {
+        "response_mime_type": "application/json",
+        "response_schema": RESPONSE_SCHEMAS[task],
+        "system_instruction": PREAMBLES[task],
+        "max_output_tokens": MAX_OUTPUT_TOKENS,
+    }
+    if tier == "standard":
+        return types.GenerateContentConfig(**fields)
     try:
-        return json.loads(json_str)
-    except Exception as e:
-        raise ValueError(f"Failed to parse JSON block: {e}\n\nJSON block:\n{json_str}\n\nRaw:\n{text}")
+        return types.GenerateContentConfig(service_tier=tier, **fields)
+    except (TypeError, ValueError):
+        return types.GenerateContentConfig(**fields)
+
+
+def task_fingerprint(task: str) -> bytes:
+    """Digest of the static parts of a task (preamble and response schema)."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(PREAMBLES[task].encode("utf-8"))
+    h.update(b"\0")
+    h.update(orjson.dumps(RESPONSE_SCHEMAS[task]))
+    return h.digest()
+
+
+def llm_cache_key(task: str, prompt: str, tier: str) -> str:
+    """Identifies an idempotent LLM call: same model, tier, task preamble, schema and prompt give the same result."""
+    h = hashlib.blake2b(TASK_FINGERPRINTS[task], digest_size=16)
+    for part in (MODEL, tier, prompt):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@llm_retry
+def generate(task: str, prompt: str, tier: str) -> Any:
+    with get_llm_semaphore():
+        resp = _MODELS.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=GEN_CONFIGS[(task, tier)]
+        )
+    # google-genai returns text on resp.text; structured output guarantees it is the JSON object
+    return orjson.loads(resp.text)
+
+
+def call_llm(task: str, prompt: str, tier: str) -> Dict[str, Any]:
+    """
+    Answers from the disk cache when possible. On a miss, the first caller runs the request;
+    concurrent callers with the same key wait on its future instead of sending their own.
+    """
+    key = llm_cache_key(task, prompt, tier)
+    disk = get_disk_cache()
+    cached = disk.get(key)
+    if cached is not None:
+        return cached
+
+    inflight, lock = get_inflight()
+    with lock:
+        fut = inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = inflight[key] = Future()
+    if not owner:
+        return fut.result()
 
+    try:
+        result = generate(task, prompt, tier)
+        disk.set(key, result, expire=LLM_DISK_CACHE_TTL_SECONDS)
+        fut.set_result(result)
+        return result
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with lock:
+            inflight.pop(key, None)
+
+
+@llm_retry
+async def agenerate(
+    aclient: Any,
+    prompt: str,
+    config: types.GenerateContentConfig,
+    gate: asyncio.Semaphore
+) -> Any:
+    async with llm_slot(gate):
+        resp = await aclient.models.generate_content(
+            model=MODEL,
+            contents=prompt,
+            config=config
+        )
+    return orjson.loads(resp.text)
+
+
+async def acall_llm(
+    aclient: Any,
+    task: str,
+    prompt: str,
+    tier: str,
+    config: types.GenerateContentConfig,
+    gate: asyncio.Semaphore
+) -> Any:
+    """Async counterpart of call_llm for run_many; shares the disk cache."""
+    key = llm_cache_key(task, prompt, tier)
+    disk = get_disk_cache()
+    cached = disk.get(key)
+    if cached is not None:
+        return cached
+
+    result = await agenerate(aclient, prompt, config, gate)
+    disk.set(key, result, expire=LLM_DISK_CACHE_TTL_SECONDS)
+    return result
+
+
+def run_many(task: str, prompts: List[str], tier: str) -> List[Any]:
+    """
+    Runs many prompts concurrently on a single event loop instead of one thread per request.
+    Results are in prompt order; a prompt whose call failed gets its exception instead of failing the whole run.
+    The async client is created and closed per run: its HTTP session is bound to the loop asyncio.run creates.
+    """
+    config = GEN_CONFIGS[(task, tier)]
 
-def call_llm(prompt: str) -> Dict[str, Any]:
-    client = get_client()
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=prompt
-    )
-    # google-genai returns text on resp.text
-    return extract_json(resp.text)
+    async def gather() -> List[Any]:
+        aclient = genai.Client(api_key=API_KEY).aio
+        gate = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+        try:
+            return await asyncio.gather(
+                *(acall_llm(aclient, task, p, tier, config, gate) for p in prompts),
+                return_exceptions=True
+            )
+        finally:
+            # Release the HTTP session while its loop is still running
+            await aclient.aclose()
+
+    return asyncio.run(gather())
+
+
+@llm_retry
+def open_stream(task: str, prompt: str, tier: str) -> Iterator[Any]:
+    """
+    Starts a streaming call. Transient errors are retried until the first chunk arrives;
+    after that, output is already on screen and a failure is reported instead.
+    Holds a concurrency slot per attempt (not through the backoff sleeps) until the stream is consumed.
+    """
+    semaphore = get_llm_semaphore()
+    semaphore.acquire()
+    try:
+        chunks = iter(_MODELS.generate_content_stream(
+            model=MODEL,
+            contents=prompt,
+            config=GEN_CONFIGS[(task, tier)]
+        ))
+        first = next(chunks, None)
+    except BaseException:
+        semaphore.release()
+        raise
+
+    def rest() -> Iterator[Any]:
+        try:
+            yield from itertools.chain([first] if first is not None else [], chunks)
+        finally:
+            semaphore.release()
+
+    return rest()
+
+
+def stream_llm(task: str, prompt: str, tier: str) -> Iterator[str]:
+    """
+    Yields the model output as it is generated, so the UI can show progress before the JSON is complete.
+    Shares the disk cache with call_llm: a cached result is yielded at once as a single chunk.
+    """
+    key = llm_cache_key(task, prompt, tier)
+    disk = get_disk_cache()
+    cached = disk.get(key)
+    if cached is not None:
+        yield orjson.dumps(cached).decode()
+        return
+
+    parts = []
+    for chunk in open_stream(task, prompt, tier):
+        if chunk.text:
+            parts.append(chunk.text)
+            yield chunk.text
+    disk.set(key, orjson.loads("".join(parts)), expire=LLM_DISK_CACHE_TTL_SECONDS)
 
 
 # ----------------------------
 # Prompt Builders (IMPORTANT)
-# Use .format() so we don't fight f-string { } escaping
+# The *_PROMPT preambles are static and go to the model as system instructions, ahead of the
+# per-call *_INPUT part, so every request shares the same prefix. Use .format() so we don't fight f-string { } escaping
 # ----------------------------
 ANALYZE_PROMPT = """
 You are a Senior QA Lead and Requirements Analyst.
@@ -72,9 +342,6 @@ You are a Senior QA Lead and Requirements Analyst.
 Task:
 Analyze the requirement and return a structured quality report.
 
-Return ONLY valid JSON in this exact schema (no markdown, no extra text):
-{schema}
-
 Rules:
 - clarity_score must be an integer 0–100.
 - Keep each list item short and specific (one sentence).
@@ -82,9 +349,6 @@ Rules:
 - Test scenarios: provide 6–12 realistic scenarios. Each item should be a single line:
   "Title — Preconditions — Steps — Expected Result" (short but concrete).
 - Be specific about missing info, assumptions, edge cases, integrations, error handling, security, and performance.
-
-Requirement:
-{requirement}
 """.strip()
 
 CLARIFY_PROMPT = """
@@ -93,17 +357,11 @@ You are a Senior QA Lead.
 Task:
 Ask clarifying questions to remove ambiguity and make the requirement testable.
 
-Return ONLY valid JSON in this exact schema (no markdown, no extra text):
-{schema}
-
 Rules:
 - Ask 6–10 focused, answerable questions.
 - Prefer questions that produce concrete values or boolean choices (limits, formats, expiry, retries, roles, permissions).
 - Order by importance (most impactful to least).
 - why_it_matters must be one concise sentence.
-
-Requirement:
-{requirement}
 """.strip()
 
 IMPROVE_PROMPT = """
@@ -112,9 +370,6 @@ You are a Senior QA Lead and Requirements Analyst.
 Task:
 Use the stakeholder answers to improve the requirement analysis and produce a refreshed quality report.
 
-Return ONLY valid JSON in this exact schema (no markdown, no extra text):
-{schema}
-
 Rules:
 - clarity_score must be an integer 0–100.
 - Keep each list item short and specific (one sentence).
@@ -122,7 +377,25 @@ Rules:
 - Test scenarios: provide 6–12 realistic scenarios:
   "Title — Preconditions — Steps — Expected Result".
 - If any answers are still vague, call that out under missing_information.
+""".strip()
+
+ANALYZE_INPUT = """
+Requirement:
+{requirement}
+""".strip()
 
+ANALYZE_MANY_PROMPT = ANALYZE_PROMPT + """
+- The requirements are numbered. Analyze each one independently and return one report per requirement, in the same order.
+""".rstrip()
+
+ANALYZE_MANY_INPUT = """
+Requirements:
+{requirements}
+""".strip()
+
+CLARIFY_INPUT = ANALYZE_INPUT
+
+IMPROVE_INPUT = """
 Original Requirement:
 {requirement}
 
@@ -150,35 +423,325 @@ CLARIFY_SCHEMA = {
     ]
 }
 
+# Short field names on the wire: every response repeats each key, so they cost output tokens.
+# The model gets the full name as the field description; expand_report() restores it.
+_SHORT_KEYS = {
+    "summary": "s",
+    "clarity_score": "cs",
+    "clarity_score_reason": "csr",
+    "ambiguities": "amb",
+    "missing_information": "mi",
+    "assumptions": "asm",
+    "risks_and_dependencies": "rd",
+    "edge_cases": "ec",
+    "acceptance_criteria": "ac",
+    "test_scenarios": "ts",
+}
+
+ANALYZE_RESPONSE_SCHEMA = response_schema({_SHORT_KEYS[k]: v for k, v in ANALYZE_SCHEMA.items()})
+for _long, _short in _SHORT_KEYS.items():
+    ANALYZE_RESPONSE_SCHEMA["properties"][_short]["description"] = _long
+CLARIFY_RESPONSE_SCHEMA = response_schema(CLARIFY_SCHEMA)
+
+# Per task: static preamble and response schema
+PREAMBLES = {
+    "analyze": ANALYZE_PROMPT,
+    "analyze_many": ANALYZE_MANY_PROMPT,
+    "clarify": CLARIFY_PROMPT,
+    "improve": IMPROVE_PROMPT,
+}
+RESPONSE_SCHEMAS = {
+    "analyze": ANALYZE_RESPONSE_SCHEMA,
+    "analyze_many": {"type": "ARRAY", "items": ANALYZE_RESPONSE_SCHEMA},
+    "clarify": CLARIFY_RESPONSE_SCHEMA,
+    "improve": ANALYZE_RESPONSE_SCHEMA,
+}
+# Built from the dicts above on every run, so a reload never serves a stale prompt or cache key;
+# per call it's a lookup instead of re-validating the schema and re-serializing it for the key.
+TIERS = ("priority", "flex", "standard")
+GEN_CONFIGS = {(task, tier): gen_config(task, tier) for task in PREAMBLES for tier in TIERS}
+TASK_FINGERPRINTS = {task: task_fingerprint(task) for task in PREAMBLES}
+
 
 # ----------------------------
 # Core Functions
 # ----------------------------
-def analyze_requirement(requirement: str) -> Dict[str, Any]:
-    prompt = ANALYZE_PROMPT.format(schema=json.dumps(ANALYZE_SCHEMA, indent=2), requirement=requirement)
-    return call_llm(prompt)
+def expand_report(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a short-key report from the model back to the ANALYZE_SCHEMA field names."""
+    return {long: report.get(short) for long, short in _SHORT_KEYS.items()}
+
+
+def build_analyze_prompt(requirement: str) -> str:
+    return ANALYZE_INPUT.format(requirement=requirement)
+
+
+@st.cache_data(ttl=LLM_CACHE_TTL_SECONDS, max_entries=512, show_spinner=False)
+@llm_retry
+def count_tokens(text: str) -> int:
+    """Token count via the API; much cheaper than a generate call, used to gate obviously bad inputs."""
+    return _MODELS.count_tokens(model=MODEL, contents=text).total_tokens
+
+
+def try_count_tokens(text: str) -> Optional[int]:
+    """count_tokens, or None when the API refuses (e.g. a model alias without countTokens); callers then proceed."""
+    try:
+        return count_tokens(text)
+    except errors.APIError:
+        return None
 
 
+def gate_tokens(text: str) -> Optional[int]:
+    """
+    Token count for the MIN/MAX_REQUIREMENT_TOKENS gates, or None when they don't apply.
+    Only texts near a threshold by length are counted, so a normal Analyze click starts streaming at once.
+    The gate fails open: if counting fails, the analysis goes ahead.
+    """
+    if GATE_MIN_CHARS <= len(text) <= GATE_MAX_CHARS:
+        return None
+    return try_count_tokens(text)
+
+
+def too_short_report(n_tokens: int) -> Dict[str, Any]:
+    """Canned report for requirements too short to be worth a model call."""
+    report: Dict[str, Any] = {k: [] for k, v in ANALYZE_SCHEMA.items() if isinstance(v, list)}
+    report.update({
+        "summary": "Requirement too short to analyze.",
+        "clarity_score": 0,
+        "clarity_score_reason": f"Only {n_tokens} tokens; a testable requirement needs more detail.",
+        "missing_information": ["Who the user/actor is, what they do, the expected outcome and any constraints."],
+    })
+    return report
+
+
+# Identical inputs are answered from Streamlit's in-memory cache instead of another round trip.
+@st.cache_data(ttl=LLM_CACHE_TTL_SECONDS, max_entries=512, show_spinner=False)
+def analyze_requirement(
+    requirement: str,
+    tier: str = "priority",
+    _write_stream: Optional[Callable[[Iterator[str]], Any]] = None
+) -> Dict[str, Any]:
+    """
+    `tier` defaults to "priority" for the interactive Analyzer; background callers pass "flex".
+    `_write_stream` (e.g. st.write_stream) shows the output while it is generated.
+    It is not part of the cache key; on a cache hit Streamlit replays what it displayed.
+    """
+    n_tokens = gate_tokens(requirement)
+    if n_tokens is not None and n_tokens < MIN_REQUIREMENT_TOKENS:
+        return too_short_report(n_tokens)
+
+    prompt = build_analyze_prompt(requirement)
+    if _write_stream is None:
+        return expand_report(call_llm("analyze", prompt, tier))
+    return expand_report(orjson.loads(_write_stream(stream_llm("analyze", prompt, tier))))
+
+
+@st.cache_data(ttl=LLM_CACHE_TTL_SECONDS, max_entries=512, show_spinner=False)
 def generate_clarifying_questions(requirement: str) -> Dict[str, Any]:
-    prompt = CLARIFY_PROMPT.format(schema=json.dumps(CLARIFY_SCHEMA, indent=2), requirement=requirement)
-    return call_llm(prompt)
+    prompt = CLARIFY_INPUT.format(requirement=requirement)
+    return call_llm("clarify", prompt, "flex")
 
 
-def improve_with_answers(requirement: str, q_and_a: List[Dict[str, str]]) -> Dict[str, Any]:
+@st.cache_data(ttl=LLM_CACHE_TTL_SECONDS, max_entries=512, show_spinner=False)
+def improve_with_answers(requirement: str, q_and_a: Tuple[Tuple[str, str, str], ...]) -> Dict[str, Any]:
+    """`q_and_a` holds (id, question, answer) tuples."""
     qa_lines = []
-    for item in q_and_a:
-        qa_lines.append(f"{item['id']}. {item['question']}\nAnswer: {item.get('answer','').strip()}")
+    for qid, question, answer in q_and_a:
+        qa_lines.append(f"{qid}. {question}\nAnswer: {answer.strip()}")
     qa_text = "\n\n".join(qa_lines).strip()
 
-    prompt = IMPROVE_PROMPT.format(
-        schema=json.dumps(ANALYZE_SCHEMA, indent=2),
-        requirement=requirement,
-        qa_text=qa_text
+    prompt = IMPROVE_INPUT.format(requirement=requirement, qa_text=qa_text)
+    return expand_report(call_llm("improve", prompt, "flex"))
+
+
+def build_analyze_many_prompt(requirements: List[str]) -> str:
+    numbered = "\n".join(f"{i}. {r}" for i, r in enumerate(requirements, start=1))
+    return ANALYZE_MANY_INPUT.format(requirements=numbered)
+
+
+def expand_reports(requirements: List[str], reports: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Checks a multi-requirement response has one report per requirement and expands each of them."""
+    if len(reports) != len(requirements):
+        raise ValueError(f"Expected {len(requirements)} reports, model returned {len(reports)}.")
+    return [expand_report(r) for r in reports]
+
+
+def analyze_all(requirements: List[str]) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Analyzes REQUIREMENTS_PER_CALL requirements per model call (one round trip instead of one per requirement),
+    with all calls in flight at once. Returns one entry per requirement, in input order: its report, or the
+    exception that failed its call (a failed call only fails the requirements it carried).
+    """
+    chunks = [requirements[i:i + REQUIREMENTS_PER_CALL] for i in range(0, len(requirements), REQUIREMENTS_PER_CALL)]
+    results = run_many("analyze_many", [build_analyze_many_prompt(c) for c in chunks], "standard")
+    out: List[Union[Dict[str, Any], Exception]] = []
+    for chunk, result in zip(chunks, results):
+        if not isinstance(result, Exception):
+            try:
+                out.extend(expand_reports(chunk, result))
+                continue
+            except ValueError as e:
+                result = e
+        out.extend([result] * len(chunk))
+    return out
+
+
+def pack_lines(text: str, max_chars: int) -> List[str]:
+    """Cuts text into pieces of at most max_chars, at line boundaries where possible."""
+    pieces: List[str] = []
+    current = ""
+    for line in text.splitlines():
+        while len(line) > max_chars:  # a single over-long line is cut hard
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and len(current) + 1 + len(line) > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    pieces.append(current)
+    return [p.strip() for p in pieces if p.strip()]
+
+
+def split_sections(requirement: str, n_tokens: int) -> List[str]:
+    """
+    Splits an oversized requirement (n_tokens as counted by the gate) into sections of at most
+    MAX_REQUIREMENT_TOKENS: its blank-line blocks are packed greedily, sized by the whole text's
+    characters-per-token ratio with 10% headroom, so there are no tiny heading-only sections.
+    Only a packed section whose estimate is near the limit is counted exactly.
+    """
+    chars_per_token = len(requirement) / n_tokens
+    budget = int(MAX_REQUIREMENT_TOKENS * chars_per_token * 0.9)
+    packed: List[str] = []
+    current = ""
+    for block in split_blocks(requirement):
+        pieces = pack_lines(block, budget) if len(block) > budget else [block]
+        for piece in pieces:
+            if current and len(current) + 2 + len(piece) > budget:
+                packed.append(current)
+                current = piece
+            else:
+                current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        packed.append(current)
+
+    sections: List[str] = []
+    for section in packed:
+        if len(section) / chars_per_token < MAX_REQUIREMENT_TOKENS * 0.75:
+            sections.append(section)
+            continue
+        exact = try_count_tokens(section)
+        if exact is None or exact <= MAX_REQUIREMENT_TOKENS:
+            sections.append(section)
+        else:  # denser than average: re-cut by its own ratio
+            sections.extend(pack_lines(section, int(len(section) * MAX_REQUIREMENT_TOKENS / exact * 0.9)))
+    return sections
+
+
+def analyze_sections(sections: List[str]) -> List[Union[Dict[str, Any], Exception]]:
+    """One analyze call per section, all in flight at once; a failed section gets its exception."""
+    results = run_many("analyze", [build_analyze_prompt(s) for s in sections], "standard")
+    return [r if isinstance(r, Exception) else expand_report(r) for r in results]
+
+
+# ----------------------------
+# Bulk (Gemini Batch Mode)
+# ----------------------------
+BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+REQUIREMENT_COLUMNS = ("requirement", "summary", "description")  # CSV header names, in order of preference
+_BLANK_LINE_RE = re.compile(r"\n\s*\n")
+
+
+def split_blocks(text: str) -> List[str]:
+    """Splits text into the non-empty blocks separated by empty lines."""
+    return [block.strip() for block in _BLANK_LINE_RE.split(text) if block.strip()]
+
+
+def parse_requirements_file(file_name: str, data: bytes) -> List[str]:
+    """
+    Reads requirements from an uploaded file:
+    - CSV with a header (e.g. a Jira export): the first REQUIREMENT_COLUMNS column found, case-insensitive
+    - CSV without a recognizable header: first non-empty cell of each row
+    - TXT: requirements separated by an empty line
+    """
+    text = data.decode("utf-8-sig")
+    if file_name.lower().endswith(".csv"):
+        reader = csv.DictReader(io.StringIO(text))
+        header = {name.strip().lower(): name for name in reader.fieldnames or [] if name}
+        column = next((header[c] for c in REQUIREMENT_COLUMNS if c in header), None)
+        if column is not None:
+            return [row[column].strip() for row in reader if (row.get(column) or "").strip()]
+
+        reqs = []
+        for row in csv.reader(io.StringIO(text)):
+            cell = next((c.strip() for c in row if c.strip()), "")
+            if cell:
+                reqs.append(cell)
+        return reqs
+    return split_blocks(text)
+
+
+def submit_batch(requirements: List[str]) -> str:
+    """Uploads one analyze request per requirement as JSONL and starts a batch job. Returns the job name."""
+    lines = []
+    for i, requirement in enumerate(requirements):
+        prompt = build_analyze_prompt(requirement)
+        lines.append(orjson.dumps({
+            "key": f"req_{i}",
+            "request": {
+                "system_instruction": {"parts": [{"text": ANALYZE_PROMPT}]},
+                "contents": [{"parts": [{"text": prompt}]}],
+                "generation_config": {
+                    "response_mime_type": "application/json",
+                    "response_schema": ANALYZE_RESPONSE_SCHEMA,
+                    "max_output_tokens": MAX_OUTPUT_TOKENS,
+                },
+            },
+        }))
+
+    uploaded = _CLIENT.files.upload(
+        file=io.BytesIO(b"\n".join(lines)),
+        config=types.UploadFileConfig(display_name="bulk-requirements", mime_type="jsonl")
+    )
+    job = _CLIENT.batches.create(
+        model=MODEL,
+        src=uploaded.name,
+        config={"display_name": "bulk-requirements"}
     )
-    return call_llm(prompt)
+    return job.name
 
 
-def render_report(report: Dict[str, Any]) -> None:
+def fetch_batch_results(job_name: str) -> Dict[str, Any]:
+    """
+    Polls a batch job. Returns {"state": ..., "results": {key: report}, "errors": {key: message}};
+    results/errors stay empty until the job has succeeded.
+    """
+    job = _CLIENT.batches.get(name=job_name)
+    state = job.state.name
+    results: Dict[str, Dict[str, Any]] = {}
+    failures: Dict[str, str] = {}
+    if state != "JOB_STATE_SUCCEEDED":
+        return {"state": state, "results": results, "errors": failures}
+
+    content = _CLIENT.files.download(file=job.dest.file_name)
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        key = item.get("key", "")
+        try:
+            if "error" in item:
+                raise ValueError(str(item["error"]))
+            parts = item["response"]["candidates"][0]["content"]["parts"]
+            results[key] = expand_report(orjson.loads("".join(p.get("text", "") for p in parts)))
+        except Exception as e:
+            failures[key] = str(e)
+    return {"state": state, "results": results, "errors": failures}
+
+
+def render_report(report: Dict[str, Any], key: Optional[str] = None) -> None:
     st.subheader("Summary")
     st.write(report.get("summary", ""))
 
@@ -192,8 +755,7 @@ def render_report(report: Dict[str, Any]) -> None:
         if not items:
             st.write("—")
             return
-        for x in items:
-            st.write(f"- {x}")
+        st.markdown("\n".join(f"- {x}" for x in items))
 
     render_list("Ambiguities", report.get("ambiguities"))
     render_list("Missing Information", report.get("missing_information"))
@@ -206,9 +768,10 @@ def render_report(report: Dict[str, Any]) -> None:
     st.divider()
     st.download_button(
         "Download JSON report",
-        data=json.dumps(report, indent=2),
+        data=orjson.dumps(report, option=orjson.OPT_INDENT_2),
         file_name="report.json",
-        mime="application/json"
+        mime="application/json",
+        key=key
     )
 
 
@@ -220,7 +783,7 @@ st.set_page_config(page_title="AI Requirement Quality Analyzer (Gemini)", layout
 st.title("AI Requirement Quality Analyzer (Gemini)")
 st.caption("Paste a requirement/user story and get a quality review + score.")
 
-tab1, tab2 = st.tabs(["Analyzer", "Agent Mode (Clarify → Improve)"])
+tab1, tab2, tab3 = st.tabs(["Analyzer", "Agent Mode (Clarify → Improve)", "Bulk"])
 
 with tab1:
     requirement = st.text_area("Requirement", height=200, placeholder="Example: User should be able to reset password using OTP.")
@@ -230,14 +793,30 @@ with tab1:
         elif not requirement.strip():
             st.warning("Please paste a requirement first.")
         else:
-            with st.spinner("Analyzing requirement..."):
-                try:
-                    report = analyze_requirement(requirement.strip())
+            try:
+                n_tokens = gate_tokens(requirement.strip())
+                if n_tokens is not None and n_tokens > MAX_REQUIREMENT_TOKENS:
+                    with st.spinner("Splitting into sections..."):
+                        sections = split_sections(requirement.strip(), n_tokens)
+                    st.warning(f"Requirement is {n_tokens} tokens (limit {MAX_REQUIREMENT_TOKENS}); "
+                               f"analyzing its {len(sections)} section(s) separately. Sections are separated by an empty line.")
+                    with st.spinner("Analyzing sections..."):
+                        reports = analyze_sections(sections)
+                    st.success("Analysis complete.")
+                    for i, (section, report) in enumerate(zip(sections, reports)):
+                        with st.expander(f"Section {i + 1}: {section[:80]}"):
+                            if isinstance(report, Exception):
+                                st.error(str(report))
+                            else:
+                                render_report(report, key=f"download_section_{i}")
+                else:
+                    with st.expander("Raw model output", expanded=True):
+                        report = analyze_requirement(requirement.strip(), _write_stream=st.write_stream)
                     st.session_state["last_report"] = report
                     st.success("Analysis complete.")
                     render_report(report)
-                except Exception as e:
-                    st.error(str(e))
+            except Exception as e:
+                st.error(str(e))
 
 with tab2:
     st.write("Step 1: Generate clarifying questions. Step 2: Answer them. Step 3: Improve analysis using answers.")
@@ -254,7 +833,11 @@ with tab2:
             else:
                 with st.spinner("Generating clarifying questions..."):
                     try:
-                        q_report = generate_clarifying_questions(agent_req.strip())
+                        # Speculatively start the baseline analysis too, so it's ready while the user answers
+                        executor = get_executor()
+                        fut_q = executor.submit(generate_clarifying_questions, agent_req.strip())
+                        st.session_state["agent_baseline_future"] = executor.submit(analyze_requirement, agent_req.strip(), "flex")
+                        q_report = fut_q.result()
                         questions = q_report.get("clarifying_questions", [])
                         st.session_state["agent_questions"] = questions
                         st.session_state["agent_req"] = agent_req.strip()
@@ -264,7 +847,7 @@ with tab2:
 
     with colB:
         if st.button("Reset Agent State"):
-            for k in ["agent_questions", "agent_req", "agent_answers", "improved_report"]:
+            for k in ["agent_questions", "agent_req", "agent_answers", "agent_baseline_future", "improved_report"]:
                 if k in st.session_state:
                     del st.session_state[k]
             st.success("Reset done.")
@@ -282,6 +865,16 @@ with tab2:
             ans = st.text_input(f"Answer for {qid}", key=f"ans_{qid}")
             answers.append({"id": qid, "question": qtext, "answer": ans})
 
+        baseline = st.session_state.get("agent_baseline_future")
+        if baseline is not None:
+            with st.expander("Baseline report (before answers)"):
+                if not baseline.done():
+                    st.caption("Still generating, it will show up on your next interaction.")
+                elif baseline.exception():
+                    st.error(str(baseline.exception()))
+                else:
+                    render_report(baseline.result(), key="download_baseline")
+
         if st.button("2) Improve analysis using my answers", type="primary"):
             req = st.session_state.get("agent_req", "").strip()
             if not req:
@@ -289,7 +882,8 @@ with tab2:
             else:
                 with st.spinner("Improving analysis..."):
                     try:
-                        improved = improve_with_answers(req, answers)
+                        qa = tuple((a["id"], a["question"], a["answer"]) for a in answers)
+                        improved = improve_with_answers(req, qa)
                         st.session_state["improved_report"] = improved
                         st.success("Improved report generated.")
                         render_report(improved)
@@ -298,7 +892,81 @@ with tab2:
     else:
         st.info("Click **1) Generate clarifying questions** to begin.")
 
-# Footer debug (optional)
-with st.expander("Debug (optional)"):
-    st.write("MODEL:", MODEL)
-    st.write("API key loaded:", "Yes" if API_KEY else "No")
\ No newline at end of file
+with tab3:
+    st.write("Upload a CSV (one requirement per row) or TXT (requirements separated by an empty line). "
+             "**Analyze now** sends several requirements per request and waits for the results; "
+             "**Submit batch job** runs a Gemini batch job: half price, results usually within minutes (up to 24h).")
+
+    uploaded_file = st.file_uploader("Requirements file", type=["csv", "txt"])
+    bulk_reqs = parse_requirements_file(uploaded_file.name, uploaded_file.getvalue()) if uploaded_file else []
+    if uploaded_file:
+        st.caption(f"{len(bulk_reqs)} requirement(s) found.")
+
+    colC, colD, colE = st.columns(3)
+    with colC:
+        if st.button("Analyze now", type="primary"):
+            if not API_KEY:
+                st.error("GEMINI_API_KEY not found. Add it to .env file.")
+            elif not bulk_reqs:
+                st.warning("Please upload a file with at least one requirement.")
+            else:
+                with st.spinner(f"Analyzing {len(bulk_reqs)} requirement(s)..."):
+                    try:
+                        st.session_state["bulk_reports"] = list(zip(bulk_reqs, analyze_all(bulk_reqs)))
+                        st.success("Analysis complete.")
+                    except Exception as e:
+                        st.error(str(e))
+
+    with colD:
+        if st.button("Submit batch job"):
+            if not API_KEY:
+                st.error("GEMINI_API_KEY not found. Add it to .env file.")
+            elif not bulk_reqs:
+                st.warning("Please upload a file with at least one requirement.")
+            else:
+                with st.spinner("Submitting batch job..."):
+                    try:
+                        st.session_state["batch_job_name"] = submit_batch(bulk_reqs)
+                        st.session_state["batch_requirements"] = bulk_reqs
+                        st.session_state.pop("batch_results", None)
+                        st.success(f"Batch job submitted: {st.session_state['batch_job_name']}")
+                    except Exception as e:
+                        st.error(str(e))
+
+    with colE:
+        if st.button("Check results", disabled="batch_job_name" not in st.session_state):
+            with st.spinner("Checking batch job..."):
+                try:
+                    st.session_state["batch_results"] = fetch_batch_results(st.session_state["batch_job_name"])
+                except Exception as e:
+                    st.error(str(e))
+
+    for i, (req, report) in enumerate(st.session_state.get("bulk_reports", [])):
+        with st.expander(f"{i + 1}. {req[:80]}"):
+            if isinstance(report, Exception):
+                st.error(str(report))
+            else:
+                render_report(report, key=f"download_bulk_{i}")
+
+    batch = st.session_state.get("batch_results")
+    if batch:
+        if batch["state"] not in BATCH_DONE_STATES:
+            st.info(f"Job state: {batch['state']}. Check again later.")
+        elif batch["state"] != "JOB_STATE_SUCCEEDED":
+            st.error(f"Batch job ended with state {batch['state']}.")
+        else:
+            st.success(f"{len(batch['results'])} report(s) ready.")
+            for i, req in enumerate(st.session_state.get("batch_requirements", [])):
+                key = f"req_{i}"
+                with st.expander(f"{i + 1}. {req[:80]}"):
+                    if key in batch["results"]:
+                        render_report(batch["results"][key], key=f"download_{key}")
+                    else:
+                        st.error(batch["errors"].get(key, "No result returned for this requirement."))
+
+# Footer debug (optional), only rendered when switched on in the sidebar
+st.sidebar.checkbox("Show debug info", key="debug_on")
+if st.session_state.get("debug_on"):
+    with st.expander("Debug (optional)", expanded=True):
+        st.write("MODEL:", MODEL)
+        st.write("API key loaded:", "Yes" if API_KEY else "No")
\ No newline at end of file
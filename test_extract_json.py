@@ -0,0 +1,43 @@
+"""Tests for extract_json() in req_analyzer.
+
+Run with `python -m pytest test_extract_json.py`, or directly with
+`python test_extract_json.py`.
+"""
+import pytest
+
+from req_analyzer import extract_json
+
+
+def test_pure_json():
+    assert extract_json('{"summary": "ok", "clarity_score": 80}') == {"summary": "ok", "clarity_score": 80}
+
+
+def test_prose_around_json():
+    text = 'Here is the report:\n```json\n{"summary": "ok"}\n```\nLet me know!'
+    assert extract_json(text) == {"summary": "ok"}
+
+
+def test_two_objects_returns_first():
+    assert extract_json('{"a": 1}\n{"b": 2}') == {"a": 1}
+
+
+def test_braces_inside_strings():
+    text = 'Report: {"summary": "use } and { freely", "edge_cases": ["\\"{\\""]}'
+    assert extract_json(text) == {"summary": "use } and { freely", "edge_cases": ['"{"']}
+
+
+def test_placeholder_braces_in_prose():
+    assert extract_json('Use {name} placeholders. {"a":1}') == {"a": 1}
+
+
+def test_unclosed_brace_in_prose():
+    assert extract_json('Note: {unclosed. {"a":1}') == {"a": 1}
+
+
+def test_no_json():
+    with pytest.raises(ValueError):
+        extract_json("Sorry, I can't help with that {requirement}.")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))